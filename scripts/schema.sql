@@ -48,4 +48,6 @@ CREATE TABLE sales_data (
     sale_price DECIMAL(10,2),
     sale_date DATE,
     demand_signal DECIMAL(3,2)
-);
\ No newline at end of file
+);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_competitor_prices_product_scraped ON competitor_prices (product_id, scraped_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_competitor_prices_scraped_brin ON competitor_prices USING brin (scraped_at);
@@ -1,21 +1,26 @@
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-import json
 import os
+from functools import lru_cache
 
+import orjson
+
+from sqlalchemy import exists, insert, literal, select
 from sqlalchemy.orm import Session
 from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone, ServerlessSpec
-import redis
+from config.redis_config import redis_client, redis_binary_client
 
-from config.database import get_db, SessionLocal, save_agent_decision
+from config.database import SessionLocal, ReadSessionLocal, enqueue_agent_decision
 from models.competitor_prices import CompetitorPrice
 from config.settings import settings
 from models.agent_decisions import AgentDecision
+from tools.event_codec import unpack_scrape_event
+from core.response_cache import invalidate_pricing_history
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 class CompetitorMonitoringAgent:
@@ -29,11 +34,12 @@ class CompetitorMonitoringAgent:
     
     def __init__(self):
         self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.redis_client = redis.Redis(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379)),
-            decode_responses=True
-        )
+        # Per-instance memo for repeated products and queries; a decorated method would
+        # share one cache across instances and keep each instance alive
+        self._encode_text = lru_cache(maxsize=1024)(self._encode_text_uncached)
+        self.redis_client = redis_client
+        # Scrape events are msgpack-encoded, so they need a binary-safe client
+        self.redis_binary_client = redis_binary_client
         self.pinecone_api_key = os.getenv('PINECONE_API_KEY')
         self.pinecone_index_name = os.getenv('PINECONE_INDEX_NAME', 'competitor-data')
         
@@ -46,7 +52,7 @@ class CompetitorMonitoringAgent:
             self.pc = None
             
         # Subscribe to Redis channel for web scraping updates
-        self.pubsub = self.redis_client.pubsub()
+        self.pubsub = self.redis_binary_client.pubsub()
         self.pubsub.subscribe('scraped_data')
         
     def _ensure_pinecone_index(self):
@@ -74,7 +80,7 @@ class CompetitorMonitoringAgent:
             logger.info(f"Pinecone index '{self.pinecone_index_name}' is ready")
             
         except Exception as e:
-            logger.error(f"Error setting up Pinecone index: {e}")
+            logger.error("Error setting up Pinecone index: %s", e)
             self.index = None
     
     def _create_product_embedding(self, product_data: Dict[str, Any]) -> List[float]:
@@ -83,8 +89,11 @@ class CompetitorMonitoringAgent:
         text_for_embedding = f"{product_data.get('product_name', '')} {product_data.get('category', '')} {product_data.get('competitor_name', '')}"
         
         # Generate embedding
-        embedding = self.model.encode(text_for_embedding)
-        return embedding.tolist()
+        return list(self._encode_text(text_for_embedding))
+    
+    def _encode_text_uncached(self, text: str) -> tuple:
+        """Encode text with the sentence transformer; wrapped per instance by _encode_text"""
+        return tuple(self.model.encode(text).tolist())
     
     def _store_in_pinecone(self, product_data: Dict[str, Any], embedding: List[float]):
         """Store product data and embedding in Pinecone"""
@@ -107,7 +116,7 @@ class CompetitorMonitoringAgent:
             )
             logger.info(f"[CompetitorMonitoringAgent] Stored embedding for product {product_data['product_id']} in Pinecone")
         except Exception as e:
-            logger.error(f"[CompetitorMonitoringAgent] Error storing in Pinecone: {e}")
+            logger.error("[CompetitorMonitoringAgent] Error storing in Pinecone: %s", e)
     
     def process_new_competitor_data(self, product_data: Dict[str, Any]):
         """Process new competitor data from web scraping agent"""
@@ -127,104 +136,123 @@ class CompetitorMonitoringAgent:
                     product_id=product_data.get("product_id"),
                     agent_name="CompetitorMonitoringAgent",
                     decision_type="monitoring",
-                    input_data=json.dumps(product_data),
-                    output_data=json.dumps({"embedding": embedding}),
+                    input_data=orjson.dumps(product_data, default=str).decode(),
+                    output_data=orjson.dumps({"embedding": embedding}).decode(),
                     confidence_score=None,
                     explanation="Processed competitor data, created embedding, and stored in DB/Pinecone.",
                     timestamp=datetime.now()
                 )
-                with next(get_db()) as db:
-                    save_agent_decision(db, decision_dict)
+                enqueue_agent_decision(decision_dict)
             except Exception as e:
-                logger.error(f"[CompetitorMonitoringAgent] Error logging agent decision: {e}")
+                logger.error("[CompetitorMonitoringAgent] Error logging agent decision: %s", e)
         except Exception as e:
-            logger.error(f"[CompetitorMonitoringAgent] Error processing competitor data: {e}")
+            logger.error("[CompetitorMonitoringAgent] Error processing competitor data: %s", e)
     
     def _store_in_postgresql(self, product_data: Dict[str, Any]):
         """Store competitor data in PostgreSQL"""
         db = SessionLocal()
         try:
-            existing = db.query(CompetitorPrice).filter(
-                CompetitorPrice.product_id == product_data['product_id'],
-                CompetitorPrice.competitor_name == product_data['competitor_name'],
-                CompetitorPrice.scraped_at == product_data['scraped_at']
-            ).first()
-            if not existing:
-                competitor_price = CompetitorPrice(
-                    product_id=product_data['product_id'],
-                    product_name=product_data.get('product_name'),
-                    category=product_data.get('category'),
-                    competitor_name=product_data['competitor_name'],
-                    competitor_price=product_data['competitor_price'],
-                    scraped_at=product_data['scraped_at']
+            values = {
+                'product_id': product_data['product_id'],
+                'product_name': product_data.get('product_name'),
+                'category': product_data.get('category'),
+                'competitor_name': product_data['competitor_name'],
+                'competitor_price': product_data['competitor_price'],
+                'scraped_at': product_data['scraped_at']
+            }
+            columns = CompetitorPrice.__table__.c
+            # INSERT ... SELECT ... WHERE NOT EXISTS: the duplicate check and the write
+            # share one round-trip instead of a SELECT followed by an INSERT
+            result = db.execute(
+                insert(CompetitorPrice).from_select(
+                    list(values),
+                    select(*[literal(value, type_=columns[name].type) for name, value in values.items()]).where(
+                        ~exists().where(
+                            CompetitorPrice.product_id == values['product_id'],
+                            CompetitorPrice.competitor_name == values['competitor_name'],
+                            CompetitorPrice.scraped_at == values['scraped_at']
+                        )
+                    )
                 )
-                db.add(competitor_price)
-                db.commit()
+            )
+            db.commit()
+            if result.rowcount:
+                invalidate_pricing_history([product_data['product_id']])
                 logger.info(f"[CompetitorMonitoringAgent] Stored competitor price in PostgreSQL: {product_data['product_name']}")
             else:
                 logger.info(f"[CompetitorMonitoringAgent] Competitor price already exists in PostgreSQL for: {product_data['product_name']}")
         except Exception as e:
             db.rollback()
-            logger.error(f"[CompetitorMonitoringAgent] Error storing in PostgreSQL: {e}")
+            logger.error("[CompetitorMonitoringAgent] Error storing in PostgreSQL: %s", e)
         finally:
             db.close()
     
     def get_similar_products(self, product_name: str, category: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Find similar products using vector similarity search"""
-        if not self.index:
-            logger.warning("[CompetitorMonitoringAgent] Pinecone index not available, cannot perform similarity search")
-            return []
+        """Find similar products using vector similarity search; returns [] if the search fails"""
         try:
-            query_text = f"{product_name} {category}"
-            logger.info(f"[CompetitorMonitoringAgent] Creating embedding for similarity search: '{query_text}'")
-            query_embedding = self.model.encode(query_text).tolist()
-            logger.info(f"[CompetitorMonitoringAgent] Querying Pinecone for similar products")
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=limit,
-                include_metadata=True
-            )
-            similar_products = []
-            for match in results.matches:
-                similar_products.append({
-                    'product_id': match.metadata['product_id'],
-                    'product_name': match.metadata['product_name'],
-                    'category': match.metadata['category'],
-                    'competitor_name': match.metadata['competitor_name'],
-                    'competitor_price': match.metadata['competitor_price'],
-                    'scraped_at': match.metadata['scraped_at'],
-                    'similarity_score': match.score
-                })
-            logger.info(f"[CompetitorMonitoringAgent] Found {len(similar_products)} similar products for '{product_name}'")
-            return similar_products
+            return self.find_similar_products(product_name, category, limit)
         except Exception as e:
-            logger.error(f"[CompetitorMonitoringAgent] Error finding similar products: {e}")
+            logger.error("[CompetitorMonitoringAgent] Error finding similar products: %s", e)
             return []
+
+    def find_similar_products(self, product_name: str, category: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Like get_similar_products, but raises when Pinecone is unavailable or the query fails"""
+        if not self.index:
+            raise RuntimeError("Pinecone index not available, cannot perform similarity search")
+        query_text = f"{product_name} {category}"
+        logger.info(f"[CompetitorMonitoringAgent] Creating embedding for similarity search: '{query_text}'")
+        query_embedding = list(self._encode_text(query_text))
+        logger.info(f"[CompetitorMonitoringAgent] Querying Pinecone for similar products")
+        results = self.index.query(
+            vector=query_embedding,
+            top_k=limit,
+            include_metadata=True
+        )
+        similar_products = []
+        for match in results.matches:
+            similar_products.append({
+                'product_id': match.metadata['product_id'],
+                'product_name': match.metadata['product_name'],
+                'category': match.metadata['category'],
+                'competitor_name': match.metadata['competitor_name'],
+                'competitor_price': match.metadata['competitor_price'],
+                'scraped_at': match.metadata['scraped_at'],
+                'similarity_score': match.score
+            })
+        logger.info(f"[CompetitorMonitoringAgent] Found {len(similar_products)} similar products for '{product_name}'")
+        return similar_products
     
     def get_competitor_price_history(self, product_id: str, competitor_name: str, days: int = 30) -> List[Dict[str, Any]]:
         """Get price history for a specific product from a competitor"""
-        db = SessionLocal()
+        db = ReadSessionLocal()
         try:
             cutoff_date = datetime.now() - timedelta(days=days)
             
-            prices = db.query(CompetitorPrice).filter(
-                CompetitorPrice.product_id == product_id,
-                CompetitorPrice.competitor_name == competitor_name,
-                CompetitorPrice.scraped_at >= cutoff_date
-            ).order_by(CompetitorPrice.scraped_at.desc()).all()
+            # Only the two columns the response needs, as plain rows
+            rows = db.execute(
+                select(
+                    CompetitorPrice.competitor_price,
+                    CompetitorPrice.scraped_at
+                ).where(
+                    CompetitorPrice.product_id == product_id,
+                    CompetitorPrice.competitor_name == competitor_name,
+                    CompetitorPrice.scraped_at >= cutoff_date
+                ).order_by(CompetitorPrice.scraped_at.desc())
+            )
             
-            price_history = []
-            for price in prices:
-                price_history.append({
-                    'competitor_price': float(price.competitor_price),
-                    'scraped_at': price.scraped_at.isoformat()
-                })
+            price_history = [
+                {
+                    'competitor_price': float(row.competitor_price),
+                    'scraped_at': row.scraped_at.isoformat()
+                }
+                for row in rows
+            ]
             
             logger.info(f"Retrieved {len(price_history)} price records for product {product_id}")
             return price_history
             
         except Exception as e:
-            logger.error(f"Error retrieving price history: {e}")
+            logger.error("Error retrieving price history: %s", e)
             return []
         finally:
             db.close()
@@ -236,13 +264,13 @@ class CompetitorMonitoringAgent:
             for message in self.pubsub.listen():
                 if message['type'] == 'message':
                     try:
-                        logger.info(f"[CompetitorMonitoringAgent] Received message from Redis: {message['data']}")
-                        data = json.loads(message['data'])
+                        logger.info(f"[CompetitorMonitoringAgent] Received message from Redis: {message['data']!r}")
+                        data = unpack_scrape_event(message['data'])
                         self.process_new_competitor_data(data)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"[CompetitorMonitoringAgent] Error parsing JSON message: {e}")
+                    except ValueError as e:
+                        logger.error("[CompetitorMonitoringAgent] Error decoding message: %s", e)
                     except Exception as e:
-                        logger.error(f"[CompetitorMonitoringAgent] Error processing message: {e}")
+                        logger.error("[CompetitorMonitoringAgent] Error processing message: %s", e)
         except KeyboardInterrupt:
             logger.info("[CompetitorMonitoringAgent] Stopping competitor monitoring agent...")
         finally:
@@ -254,15 +282,15 @@ class CompetitorMonitoringAgent:
         logger.info("Running competitor monitoring cycle...")
         
         # Process any pending messages from Redis
-        messages = self.redis_client.lrange('pending_competitor_data', 0, -1)
+        messages = self.redis_binary_client.lrange('pending_competitor_data', 0, -1)
         for message in messages:
             try:
-                data = json.loads(message)
+                data = unpack_scrape_event(message)
                 self.process_new_competitor_data(data)
                 # Remove processed message
-                self.redis_client.lrem('pending_competitor_data', 1, message)
+                self.redis_binary_client.lrem('pending_competitor_data', 1, message)
             except Exception as e:
-                logger.error(f"Error processing pending message: {e}")
+                logger.error("Error processing pending message: %s", e)
         
         logger.info("Competitor monitoring cycle completed")
 
@@ -288,7 +316,7 @@ def run_competitor_monitoring_agent(input_data: Dict[str, Any] = None) -> Dict[s
                 "message": "Competitor monitoring cycle completed"
             }
     except Exception as e:
-        logger.error(f"Error in competitor monitoring agent: {e}")
+        logger.error("Error in competitor monitoring agent: %s", e)
         return {
             "status": "error",
             "message": f"Error: {str(e)}"
@@ -3,24 +3,29 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import json
 import os
+import orjson
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
 import time
 
 from crewai import Agent, Task, Crew, Process
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import HumanMessage, AIMessage
-import redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.redis_config import redis_client
 
 from agents.web_scraping_agent import run_web_scraping_agent
 from agents.competitor_monitoring_agent import run_competitor_monitoring_agent, competitor_monitoring_agent
 from config.llm_config import llm
-from config.database import SessionLocal, save_agent_decision, get_db
+from config.database import ReadSessionLocal, enqueue_agent_decision, get_product_features
 from models.competitor_prices import CompetitorPrice
 from models.agent_decisions import AgentDecision
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 class SupervisorAgent:
@@ -39,12 +44,8 @@ class SupervisorAgent:
             return_messages=True
         )
         
-        # Initialize Redis client
-        self.redis_client = redis.Redis(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379)),
-            decode_responses=True
-        )
+        # Shared Redis client
+        self.redis_client = redis_client
         
         # Initialize CrewAI agents
         self._initialize_agents()
@@ -53,6 +54,10 @@ class SupervisorAgent:
         self.current_cycle = 0
         self.last_cycle_time = None
         self.cycle_interval = int(os.getenv('PRICING_CYCLE_INTERVAL_MINUTES', 30))
+        # Products in a cycle are processed concurrently; the CrewAI agents are shared
+        # between them, so crew runs themselves are serialized
+        self.cycle_concurrency = int(os.getenv('PRICING_CYCLE_CONCURRENCY', 4))
+        self._crew_lock = threading.Lock()
         
     def _initialize_agents(self):
         """Initialize CrewAI agents for the pricing system"""
@@ -264,13 +269,16 @@ class SupervisorAgent:
             "overall_status": "success"
         }
         try:
-            for product in products:
-                logger.info(f"[SupervisorAgent] Processing product: {product}")
-                product_result = self._process_single_product(product)
-                logger.info(f"[SupervisorAgent] Product result: {product_result}")
-                cycle_results["products"].append(product_result)
-                if product_result["status"] == "error":
-                    cycle_results["overall_status"] = "partial_failure"
+            # One query for every product's stored price/stock/demand figures
+            features = self._load_product_features(products)
+            process = partial(self._process_single_product, features=features)
+            # Scraping and monitoring for each product are independent, so overlap them
+            with ThreadPoolExecutor(max_workers=max(1, min(self.cycle_concurrency, len(products)))) as pool:
+                for product_result in pool.map(process, products):
+                    logger.info(f"[SupervisorAgent] Product result: {product_result}")
+                    cycle_results["products"].append(product_result)
+                    if product_result["status"] == "error":
+                        cycle_results["overall_status"] = "partial_failure"
             self.current_cycle += 1
             self.last_cycle_time = datetime.now()
             self.memory.save_context(
@@ -281,19 +289,32 @@ class SupervisorAgent:
             self.redis_client.publish('pricing_cycle_completed', json.dumps(cycle_results, default=str))
             logger.info(f"[SupervisorAgent] Published pricing cycle completion to Redis.")
         except Exception as e:
-            logger.error(f"[SupervisorAgent] Error in pricing cycle: {e}")
+            logger.error("[SupervisorAgent] Error in pricing cycle: %s", e)
             cycle_results["overall_status"] = "error"
             cycle_results["error"] = str(e)
         cycle_results["end_time"] = datetime.now().isoformat()
         logger.info(f"[SupervisorAgent] Pricing cycle {cycle_results['cycle_number']} ended at {cycle_results['end_time']}")
         return cycle_results
     
-    def _process_single_product(self, product: Dict[str, Any]) -> Dict[str, Any]:
+    def _load_product_features(self, products: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        product_ids = [product["product_id"] for product in products if product.get("product_id")]
+        db = ReadSessionLocal()
+        try:
+            return get_product_features(db, product_ids)
+        except Exception as e:
+            logger.error("[SupervisorAgent] Error loading product features: %s", e)
+            return {}
+        finally:
+            db.close()
+    
+    def _process_single_product(self, product: Dict[str, Any], features: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
         product_id = product.get("product_id")
+        stored = (features or {}).get(product_id, {})
         domain = product.get("domain", "amazon.com")
         category = product.get("category", "general")
         product_name = product.get("product_name")
         logger.info(f"[SupervisorAgent] --- Start processing product {product_id}: {product_name} ---")
+        logger.info(f"[SupervisorAgent] Processing product: {product}")
         try:
             logger.info(f"[SupervisorAgent] Step 1: Web Scraping Agent")
             scraping_result = run_web_scraping_agent({
@@ -330,26 +351,32 @@ class SupervisorAgent:
                 self._create_demand_analysis_task(product_id),
                 self._create_inventory_tracking_task(product_id),
                 self._create_pricing_decision_task(
-                    {"scraped_data": scraped_data, "similar_products": similar_products},
-                    {"demand_score": 0.75},
-                    {"current_stock": 100}
+                    {
+                        "scraped_data": scraped_data,
+                        "similar_products": similar_products,
+                        "avg_competitor_price": stored.get("avg_competitor_price"),
+                        "competitor_price_gap": stored.get("competitor_price_gap")
+                    },
+                    {"demand_score": stored.get("demand_score", 0.75)},
+                    {"current_stock": stored.get("stock_level", 100)}
                 )
             ]
             logger.info(f"[SupervisorAgent] Step 4: Running CrewAI workflow with {len(tasks)} tasks.")
-            crew = Crew(
-                agents=[
-                    self.supervisor_agent,
-                    self.web_scraping_agent,
-                    self.competitor_monitoring_agent,
-                    self.pricing_decision_agent,
-                    self.demand_analysis_agent,
-                    self.inventory_tracking_agent
-                ],
-                tasks=tasks,
-                process=Process.sequential,
-                verbose=True
-            )
-            result = crew.kickoff()
+            with self._crew_lock:
+                crew = Crew(
+                    agents=[
+                        self.supervisor_agent,
+                        self.web_scraping_agent,
+                        self.competitor_monitoring_agent,
+                        self.pricing_decision_agent,
+                        self.demand_analysis_agent,
+                        self.inventory_tracking_agent
+                    ],
+                    tasks=tasks,
+                    process=Process.sequential,
+                    verbose=True
+                )
+                result = crew.kickoff()
             logger.info(f"[SupervisorAgent] CrewAI workflow result: {result}")
             logger.info(f"[SupervisorAgent] --- End processing product {product_id}: {product_name} ---")
             return {
@@ -361,7 +388,7 @@ class SupervisorAgent:
                 "timestamp": datetime.now().isoformat()
             }
         except Exception as e:
-            logger.error(f"[SupervisorAgent] Error processing product {product_id}: {e}")
+            logger.error("[SupervisorAgent] Error processing product %s: %s", product_id, e)
             return {
                 "product_id": product_id,
                 "status": "error",
@@ -369,32 +396,32 @@ class SupervisorAgent:
                 "timestamp": datetime.now().isoformat()
             }
     
-    def get_pricing_history(self, product_id: str, days: int = 30) -> List[Dict[str, Any]]:
-        """Get pricing history for a product"""
-        db = SessionLocal()
-        try:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            
-            prices = db.query(CompetitorPrice).filter(
+    async def get_pricing_history_async(self, db: AsyncSession, product_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Get pricing history for a product using an async session.
+        Errors propagate so the endpoint doesn't cache an empty result.
+        """
+        cutoff_date = datetime.now() - timedelta(days=days)
+        
+        result = await db.execute(
+            select(
+                CompetitorPrice.competitor_name,
+                CompetitorPrice.competitor_price,
+                CompetitorPrice.scraped_at
+            ).where(
                 CompetitorPrice.product_id == product_id,
                 CompetitorPrice.scraped_at >= cutoff_date
-            ).order_by(CompetitorPrice.scraped_at.desc()).all()
-            
-            history = []
-            for price in prices:
-                history.append({
-                    'competitor_name': price.competitor_name,
-                    'competitor_price': float(price.competitor_price),
-                    'scraped_at': price.scraped_at.isoformat()
-                })
-            
-            return history
-            
-        except Exception as e:
-            logger.error(f"Error retrieving pricing history: {e}")
-            return []
-        finally:
-            db.close()
+            ).order_by(CompetitorPrice.scraped_at.desc())
+        )
+        
+        return [
+            {
+                'competitor_name': row.competitor_name,
+                'competitor_price': float(row.competitor_price),
+                'scraped_at': row.scraped_at.isoformat()
+            }
+            for row in result
+        ]
     
     def should_run_cycle(self) -> bool:
         """Determine if a pricing cycle should run based on timing"""
@@ -428,53 +455,76 @@ class SupervisorAgent:
         except KeyboardInterrupt:
             logger.info("Continuous monitoring stopped by user")
         except Exception as e:
-            logger.error(f"Error in continuous monitoring: {e}")
+            logger.error("Error in continuous monitoring: %s", e)
 
 # Global instance
 supervisor_agent = SupervisorAgent()
 
+# Competitor sites queried for every best-price lookup
+COMPETITOR_DOMAINS = ("amazon.in", "flipkart.com")
+
+# Embedding + Pinecone/PostgreSQL persistence of the selected product runs here,
+# off the request path; the best-price response does not depend on it.
+_persistence_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="best-price-persist")
+# The executor's own work queue is unbounded, so cap running + queued jobs and
+# drop (with a log line) once a burst fills it rather than piling up memory
+PERSISTENCE_QUEUE_SIZE = int(os.getenv("PERSISTENCE_QUEUE_SIZE", "100"))
+_persistence_slots = threading.BoundedSemaphore(PERSISTENCE_QUEUE_SIZE)
+
+def _queue_persistence(product: dict) -> bool:
+    """Hand a product to the persistence executor; returns False if the queue is full."""
+    if not _persistence_slots.acquire(blocking=False):
+        logger.warning("[SupervisorAgent] Persistence queue full, dropping %s", product.get("product_name", "Unknown"))
+        return False
+    try:
+        future = _persistence_executor.submit(run_competitor_monitoring_agent, product)
+    except BaseException:
+        _persistence_slots.release()
+        raise
+    future.add_done_callback(lambda _: _persistence_slots.release())
+    return True
+
+def _extract_price(item: dict) -> float:
+    try:
+        return float(item.get("price") or item.get("competitor_price") or 1e12)
+    except Exception:
+        return 1e12
+
 def get_best_competitor_price(product_name: str) -> dict:
     """
     For a given product name, scrape both Amazon and Flipkart, compare prices, and return the best value.
     """
-    from agents.web_scraping_agent import run_web_scraping_agent
-    from agents.competitor_monitoring_agent import run_competitor_monitoring_agent
     competitors = [
-        {"domain": "amazon.in", "category": "", "product_name": product_name},
-        {"domain": "flipkart.com", "category": "", "product_name": product_name}
+        {"domain": domain, "category": "", "product_name": product_name}
+        for domain in COMPETITOR_DOMAINS
     ]
     results = []
-    for comp in competitors:
-        result = run_web_scraping_agent(comp)
-        if result["status"] == "success" and result["data"]:
-            results.append(result["data"])
+    # Each competitor is scraped in its own browser session, so run them concurrently
+    with ThreadPoolExecutor(max_workers=len(competitors)) as pool:
+        for result in pool.map(run_web_scraping_agent, competitors):
+            if result["status"] == "success" and result["data"]:
+                results.append(result["data"])
     if not results:
         return {"status": "error", "message": "No prices found from competitors."}
     # Find the best (lowest) price
-    def extract_price(item):
-        try:
-            return float(item.get("price") or item.get("competitor_price") or 1e12)
-        except Exception:
-            return 1e12
-    best_product = min(results, key=extract_price)
-    # Save best value to DB via competitor monitoring agent
-    run_competitor_monitoring_agent(best_product)
+    best_product = min(results, key=_extract_price)
+    # Save best value to DB via competitor monitoring agent, without blocking the caller
+    _queue_persistence(best_product)
     # Log agent decision
     try:
         decision_dict = dict(
             product_id=best_product.get("product_id"),
             agent_name="SupervisorAgent",
             decision_type="best_price_selection",
-            input_data=json.dumps({"competitors": competitors}),
-            output_data=json.dumps(best_product),
+            input_data=orjson.dumps({"competitors": competitors}).decode(),
+            output_data=orjson.dumps(best_product, default=str).decode(),
             confidence_score=None,
             explanation="Selected best price from all competitors.",
             timestamp=datetime.now()
         )
-        with next(get_db()) as db:
-            save_agent_decision(db, decision_dict)
+        enqueue_agent_decision(decision_dict)
     except Exception as e:
-        logger.error(f"[SupervisorAgent] Error logging agent decision: {e}")
+        logger.error("[SupervisorAgent] Error logging agent decision: %s", e)
     return {"status": "success", "data": best_product}
 
 def run_supervisor_agent(input_data: dict = None) -> dict:
@@ -486,7 +536,7 @@ def run_supervisor_agent(input_data: dict = None) -> dict:
             if result["status"] == "success":
                 return {
                     "status": "success",
-                    "message": "Best competitor price found and saved.",
+                    "message": "Best competitor price found and queued for persistence.",
                     "data": result["data"]
                 }
             else:
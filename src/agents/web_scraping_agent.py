@@ -1,57 +1,27 @@
-from langchain.agents import initialize_agent, AgentType
-from langchain.tools import Tool
-from tools.search_tool import search_product_listing_page
-from tools.scrape_tool import scrape_products, ScrapeProductInput
-from config.database import get_db, CompetitorPrice, SessionLocal, save_agent_decision
+from tools.search_tool import search_product_listing_page_core
+from tools.scrape_tool import ScrapeProductInput
+from tools.event_codec import pack_scrape_event, to_epoch_micros
+from config.database import CompetitorPrice, SessionLocal, enqueue_agent_decision
 from models.agent_decisions import AgentDecision
 
 import logging
 from datetime import datetime
-from config.llm_config import llm
 from models.products import Product  # Import here to avoid circular import
 import urllib.parse
-import redis
-import json
+from config.redis_config import redis_binary_client
+import orjson
 import os
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-tools = [
-    Tool(
-        name="search_product_listing_page",
-        func=search_product_listing_page,
-        description="Search for a product listing page on a competitor's website"
-    ),
-    Tool(
-        name="scrape_products",
-        func=scrape_products,
-        description="Scrape a product listing page for pricing information"
-    )
-]
-
-agent = initialize_agent(
-    tools = tools,
-    llm = llm,
-    agent = AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    handle_parsing_errors = True,
-    verbose = True
-)
-
-# Initialize Redis client for Pub/Sub
-redis_client = redis.Redis(
-    host=os.getenv('REDIS_HOST', 'localhost'),
-    port=int(os.getenv('REDIS_PORT', 6379)),
-    decode_responses=True
-)
-
 def run_web_scraping_agent(input: dict) -> dict:
 
     domain = input.get("domain", "").strip()
     category = input.get("category", "").strip()
     product_name = input.get("product_name", None)
 
-    logger.info(f"[WebScrapingAgent] Input received: domain={domain}, category={category}, product_name={product_name}")
+    logger.info("[WebScrapingAgent] Input received: domain=%s, category=%s, product_name=%s", domain, category, product_name)
 
     if not domain:
         logger.error("[WebScrapingAgent] Domain is required")
@@ -61,13 +31,14 @@ def run_web_scraping_agent(input: dict) -> dict:
             "message": "Error: Domain is required"
         }
     try:
-        logger.info(f"[WebScrapingAgent] Running web scraping agent for {domain} in {category}")
+        logger.info("[WebScrapingAgent] Running web scraping agent for %s in %s", domain, category)
 
         # Search for the best product listing URL
-        search_input = {"domain": domain, "category": category, "product_name": product_name}
-        logger.info(f"[WebScrapingAgent] Invoking search_product_listing_page tool with input: {search_input}")
-        search_result = search_product_listing_page.invoke({"input": search_input})
-        logger.info(f"[WebScrapingAgent] search_product_listing_page result: {search_result}")
+        # Call the cached core directly; the URL mapping is deterministic so the tool wrapper is skipped
+        search_query = product_name or category
+        logger.debug("[WebScrapingAgent] Resolving product listing page: domain=%s, query=%s", domain, search_query)
+        search_result = list(search_product_listing_page_core(domain.lower(), search_query)) if search_query else []
+        logger.debug("[WebScrapingAgent] search_product_listing_page result: %s", search_result)
         best_url = None
         if isinstance(search_result, list) and search_result:
             if isinstance(search_result[0], dict):
@@ -78,7 +49,7 @@ def run_web_scraping_agent(input: dict) -> dict:
             best_url = search_result.get("url")
         elif isinstance(search_result, str):
             best_url = search_result
-        logger.info(f"[WebScrapingAgent] Best product listing URL determined: {best_url}")
+        logger.debug("[WebScrapingAgent] Best product listing URL determined: %s", best_url)
         # Clean up best_url if it has extra quotes
         if isinstance(best_url, str):
             best_url = best_url.strip().strip("'\"")
@@ -89,13 +60,13 @@ def run_web_scraping_agent(input: dict) -> dict:
                 if uddg_url:
                     best_url = urllib.parse.unquote(uddg_url)
         if not best_url:
-            logger.error(f"[WebScrapingAgent] No product listing URL found for {domain} in {category}")
+            logger.error("[WebScrapingAgent] No product listing URL found for %s in %s", domain, category)
             return {
                 "status": "error",
                 "data": None,
                 "message": "Error: No product listing URL found"
             }
-        logger.info(f"[WebScrapingAgent] Best product listing URL found: {best_url}")
+        logger.info("[WebScrapingAgent] Best product listing URL found: %s", best_url)
         # Scrape the product listing page
         scrape_input = {
             "url": best_url,
@@ -103,7 +74,7 @@ def run_web_scraping_agent(input: dict) -> dict:
             "category": category,
             "product_name": product_name
         }
-        logger.info(f"[WebScrapingAgent] Invoking scrape_products_core with input: {scrape_input}")
+        logger.debug("[WebScrapingAgent] Invoking scrape_products_core with input: %s", scrape_input)
         from tools.scrape_tool import scrape_products_core
         scraped_products = scrape_products_core(
             scrape_input["url"],
@@ -111,52 +82,54 @@ def run_web_scraping_agent(input: dict) -> dict:
             scrape_input["category"],
             scrape_input["product_name"]
         )
-        logger.info(f"[WebScrapingAgent] scrape_products_core returned {len(scraped_products) if scraped_products else 0} products")
+        logger.debug("[WebScrapingAgent] scrape_products_core returned %d products", len(scraped_products) if scraped_products else 0)
         if not scraped_products:
-            logger.error(f"[WebScrapingAgent] No products scraped for {domain} in {category}")
+            logger.error("[WebScrapingAgent] No products scraped for %s in %s", domain, category)
             return {
                 "status": "error",
                 "data": None,
                 "message": "Error: No products scraped"
             }
-        logger.info(f"[WebScrapingAgent] Scraped {len(scraped_products)} products for {domain} in {category}")
+        logger.info("[WebScrapingAgent] Scraped %d products for %s in %s", len(scraped_products), domain, category)
         # Return only the first (best) product
         best_product = scraped_products[0]
-        logger.info(f"[WebScrapingAgent] Best product selected: {best_product}")
+        if 'scraped_at' not in best_product:
+            best_product['scraped_at'] = datetime.utcnow()
+        logger.debug("[WebScrapingAgent] Best product selected: %s", best_product)
         # Log agent decision
         try:
             decision_dict = dict(
                 product_id=best_product.get("product_id"),
                 agent_name="WebScrapingAgent",
                 decision_type="scraping",
-                input_data=json.dumps(input),
-                output_data=json.dumps(best_product),
+                input_data=orjson.dumps(input).decode(),
+                output_data=orjson.dumps(best_product, default=str).decode(),
                 confidence_score=None,
                 explanation=f"Selected best product after scraping {domain}",
                 timestamp=datetime.now()
             )
-            with next(get_db()) as db:
-                save_agent_decision(db, decision_dict)
+            enqueue_agent_decision(decision_dict)
         except Exception as e:
-            logger.error(f"[WebScrapingAgent] Error logging agent decision: {e}")
+            logger.error("[WebScrapingAgent] Error logging agent decision: %s", e)
         # Publish to Redis for Competitor Monitoring Agent
         try:
-            if 'scraped_at' not in best_product:
-                best_product['scraped_at'] = datetime.now()
-            logger.info(f"[WebScrapingAgent] Publishing scraped data to Redis: {best_product}")
-            redis_client.publish('scraped_data', json.dumps(best_product, default=str))
-            logger.info(f"[WebScrapingAgent] Published scraped data to Redis for product: {best_product.get('product_name', 'Unknown')}")
-            redis_client.lpush('pending_competitor_data', json.dumps(best_product, default=str))
-            logger.info(f"[WebScrapingAgent] Backed up scraped data to Redis list for product: {best_product.get('product_name', 'Unknown')}")
+            logger.debug("[WebScrapingAgent] Publishing scraped data to Redis: %s", best_product)
+            # Encode once and send the publish and the backup push in a single round-trip
+            payload = pack_scrape_event({**best_product, "scraped_at": to_epoch_micros(best_product['scraped_at'])})
+            pipe = redis_binary_client.pipeline(transaction=False)
+            pipe.publish('scraped_data', payload)
+            pipe.lpush('pending_competitor_data', payload)
+            pipe.execute()
+            logger.info("[WebScrapingAgent] Published and backed up scraped data to Redis for product: %s", best_product.get('product_name', 'Unknown'))
         except Exception as e:
-            logger.error(f"[WebScrapingAgent] Error publishing to Redis: {e}")
+            logger.error("[WebScrapingAgent] Error publishing to Redis: %s", e)
         return {
             "status": "success",
             "data": best_product,
             "message": "Successfully scraped and processed 1 product"
         }
     except Exception as e:
-        logger.error(f"[WebScrapingAgent] Error in web scraping workflow: {e}")
+        logger.error("[WebScrapingAgent] Error in web scraping workflow: %s", e)
         return {"status": "error", "data": None, "message": f"Error in workflow: {e}"}
 
 if __name__ == "__main__":
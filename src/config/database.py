@@ -1,37 +1,104 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Float, cast, create_engine, func, insert, make_url, select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config.settings import settings
+from config.settings import get_settings
 from models.competitor_prices import CompetitorPrice
-from models.base import Base
 from models.products import Product
 from models.agent_decisions import AgentDecision
+from datetime import datetime, timedelta
+import atexit
+import csv
+import io
 import logging
+import os
+import queue
+import threading
+import time
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-# Convert the PostgresDsn to string explicitly
-database_url = str(settings.SQLALCHEMY_DATABASE_URI)
+# Assembled once by the settings validator; kept as a plain string from here on
+database_url = get_settings().SQLALCHEMY_DATABASE_URI
 logger.debug(f"[DEBUG] SQLAlchemy database_url: {database_url}")
 
+# Pre-ping costs a round-trip per checkout (and misbehaves behind PgBouncer transaction
+# pooling); by default rely on pool_recycle plus reconnect-on-error instead.
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+# PgBouncer in transaction mode hands each transaction a different backend, so
+# asyncpg's per-connection prepared statement cache has to be off
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+# Prepared statements kept per asyncpg connection, so repeated history/product
+# reads skip server-side parse and plan
+DB_STATEMENT_CACHE_SIZE = 0 if DB_PGBOUNCER else int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Split a fixed connection budget across uvicorn workers and the two engines each
+# worker holds, instead of a flat 30 per engine that overruns max_connections
+# (100 by default) as soon as a few workers start. Set DB_MAX_CONNECTIONS to the
+# server's max_connections minus headroom, or to PgBouncer's default_pool_size.
+# WEB_CONCURRENCY is also the worker count main.py launches, so the split matches
+# the processes actually running (one unless set).
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "80"))
+_connections_per_engine = DB_MAX_CONNECTIONS // (WEB_CONCURRENCY * 2)
+if _connections_per_engine < 3:
+    # Stay inside the budget rather than flooring past it; tiny pools will queue
+    logger.warning(
+        "DB_MAX_CONNECTIONS=%s leaves %s connections per engine for %s workers; raise it or lower WEB_CONCURRENCY",
+        DB_MAX_CONNECTIONS, _connections_per_engine, WEB_CONCURRENCY
+    )
+    _connections_per_engine = max(1, _connections_per_engine)
+DB_POOL_SIZE = max(1, _connections_per_engine * 2 // 3)
+DB_MAX_OVERFLOW = _connections_per_engine - DB_POOL_SIZE
+
 engine = create_engine(
     database_url,
-    pool_size=20,
-    max_overflow=10,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    query_cache_size=1200,
     connect_args={
         "connect_timeout": 10,
     },
-    isolation_level='read committed'
+    isolation_level="READ COMMITTED"
 )
 
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-# Create tables
-Base.metadata.create_all(bind=engine)
+
+# Pure SELECT paths share the pool but run in autocommit, skipping the implicit
+# BEGIN/COMMIT round-trips around every read
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+ReadSessionLocal = sessionmaker(autoflush=False, bind=read_engine)
+
+# Async engine for the FastAPI request path; agents keep using the sync engine from worker threads
+async_database_url = make_url(database_url).set(drivername="postgresql+asyncpg").update_query_dict(
+    {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+)
+async_engine = create_async_engine(
+    async_database_url,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    query_cache_size=1200,
+    connect_args={
+        "timeout": 10,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    },
+    isolation_level="READ COMMITTED"
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+async_read_engine = async_engine.execution_options(isolation_level="AUTOCOMMIT")
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
 
 def get_db():
     db = SessionLocal()
@@ -40,23 +107,149 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+# Below this many rows an executemany INSERT is as fast as COPY and simpler
+COPY_THRESHOLD = 100
+COMPETITOR_PRICE_COPY_COLUMNS = ("product_id", "product_name", "category", "competitor_name", "competitor_price", "scraped_at")
+
+def _copy_competitor_prices(db, rows):
+    """Stream rows into competitor_prices with COPY FROM STDIN inside the session's transaction"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        # None is written as an unquoted empty field, which CSV COPY reads as NULL
+        writer.writerow([row[column] for column in COMPETITOR_PRICE_COPY_COLUMNS])
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY competitor_prices ({', '.join(COMPETITOR_PRICE_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+    finally:
+        cursor.close()
+
 def save_competitor_prices(db, products):
+    if not products:
+        return
     try:
-        for product in products:
-            db.add(CompetitorPrice(
-                product_id=product["product_id"],
-                product_name=product.get("product_name", None),
-                category=product.get("category", None),
-                competitor_name=product["competitor_name"],
-                competitor_price=product["competitor_price"],
-                scraped_at=product["scraped_at"]
-            ))
+        rows = [
+            {
+                "product_id": product["product_id"],
+                "product_name": product.get("product_name", None),
+                "category": product.get("category", None),
+                "competitor_name": product["competitor_name"],
+                "competitor_price": product["competitor_price"],
+                "scraped_at": product["scraped_at"]
+            }
+            for product in products
+        ]
+        if len(rows) >= COPY_THRESHOLD:
+            _copy_competitor_prices(db, rows)
+        else:
+            # One executemany INSERT instead of a unit-of-work flush per instance
+            db.execute(insert(CompetitorPrice), rows)
         db.commit()
     except Exception as e:
         db.rollback()
-        logger.error(f"Error saving competitor prices: {e}")
+        logger.error("Error saving competitor prices: %s", e)
         raise
 
+async def save_products_async(db, products):
+    try:
+        # One executemany INSERT and a single commit for the whole batch
+        await db.execute(insert(Product), products)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error("Error saving products: %s", e)
+        raise
+
+async def list_products_async(db, after_id=None, limit=200):
+    """One keyset page of products ordered by id, starting after `after_id`"""
+    stmt = select(
+        Product.id,
+        Product.name,
+        Product.category,
+        Product.base_price,
+        Product.current_price,
+        Product.cost_price,
+        Product.stock_level,
+        Product.demand_score,
+        Product.last_updated
+    ).order_by(Product.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(Product.id > after_id)
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_existing_product_ids_async(db, product_ids):
+    """Return which of the given product ids already exist, in a single IN query"""
+    rows = await db.execute(select(Product.id).where(Product.id.in_(set(product_ids))))
+    return {row[0] for row in rows}
+
+# Competitor prices older than this don't reflect the current market and only
+# make the average scan grow with the table
+COMPETITOR_PRICE_WINDOW_DAYS = int(os.getenv("COMPETITOR_PRICE_WINDOW_DAYS", "30"))
+
+def get_product_features(db, product_ids):
+    """
+    Current price, stock, demand score, recent average competitor price and the gap
+    between the two for many products in one query. Returns {product_id: features};
+    null columns are left out.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+    cutoff = datetime.now() - timedelta(days=COMPETITOR_PRICE_WINDOW_DAYS)
+    avg_competitor = (
+        select(
+            CompetitorPrice.product_id,
+            # float8 AVG runs in hardware; numeric AVG is arbitrary-precision software math
+            func.avg(cast(CompetitorPrice.competitor_price, Float)).label("avg_competitor_price")
+        )
+        .where(
+            CompetitorPrice.product_id.in_(product_ids),
+            CompetitorPrice.scraped_at >= cutoff
+        )
+        .group_by(CompetitorPrice.product_id)
+        .subquery()
+    )
+    # Relative gap to the competitor average, computed in SQL (NULL without either price)
+    current_price = cast(Product.current_price, Float)
+    competitor_price_gap = (
+        (avg_competitor.c.avg_competitor_price - current_price)
+        / func.nullif(current_price, 0)
+    ).label("competitor_price_gap")
+    rows = db.execute(
+        select(
+            Product.id,
+            Product.current_price,
+            Product.stock_level,
+            Product.demand_score,
+            avg_competitor.c.avg_competitor_price,
+            competitor_price_gap
+        )
+        .outerjoin(avg_competitor, avg_competitor.c.product_id == Product.id)
+        .where(Product.id.in_(product_ids))
+    )
+    features = {}
+    for row in rows:
+        values = row._asdict()
+        product_id = values.pop("id")
+        features[product_id] = {
+            name: float(value) if name != "stock_level" else value
+            for name, value in values.items() if value is not None
+        }
+    return features
+
 def save_agent_decision(db, decision_dict):
     try:
         decision = AgentDecision(**decision_dict)
@@ -64,5 +257,88 @@ def save_agent_decision(db, decision_dict):
         db.commit()
     except Exception as e:
         db.rollback()
-        logger.error(f"Error saving agent decision: {e}")
-        raise
\ No newline at end of file
+        logger.error("Error saving agent decision: %s", e)
+        raise
+
+# Agent decisions are logged on every scrape; batch them off the request path
+# instead of committing one row at a time.
+DECISION_BATCH_SIZE = 100
+DECISION_FLUSH_INTERVAL_SECONDS = 0.1
+
+_decisions_q = queue.Queue(maxsize=10000)
+_decision_writer = None
+_decision_writer_lock = threading.Lock()
+
+def _write_decision_batch(batch):
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(AgentDecision, batch)
+        db.commit()
+    except (IntegrityError, DataError) as e:
+        # One bad row (typically a product_id with no products row) would otherwise
+        # drop the whole batch; retry row by row and lose only the rows that fail
+        db.rollback()
+        logger.warning("Batch of %s agent decisions rejected, retrying row by row: %s", len(batch), e)
+        for decision in batch:
+            try:
+                db.bulk_insert_mappings(AgentDecision, [decision])
+                db.commit()
+            except (IntegrityError, DataError) as row_error:
+                db.rollback()
+                logger.error("Dropping agent decision for %s: %s", decision.get("product_id"), row_error)
+    except Exception as e:
+        db.rollback()
+        logger.error("Error saving batch of %s agent decisions: %s", len(batch), e)
+    finally:
+        db.close()
+
+def _decision_writer_loop():
+    while True:
+        batch = [_decisions_q.get()]
+        deadline = time.monotonic() + DECISION_FLUSH_INTERVAL_SECONDS
+        while len(batch) < DECISION_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_decisions_q.get(timeout=timeout))
+            except queue.Empty:
+                break
+        try:
+            _write_decision_batch(batch)
+        finally:
+            for _ in batch:
+                _decisions_q.task_done()
+
+def _ensure_decision_writer():
+    global _decision_writer
+    if _decision_writer is not None:
+        return
+    with _decision_writer_lock:
+        if _decision_writer is None:
+            _decision_writer = threading.Thread(
+                target=_decision_writer_loop,
+                name="agent-decision-writer",
+                daemon=True
+            )
+            _decision_writer.start()
+
+def enqueue_agent_decision(decision_dict):
+    """Queue an agent decision for the background batch writer."""
+    _ensure_decision_writer()
+    try:
+        _decisions_q.put_nowait(decision_dict)
+    except queue.Full:
+        logger.warning("Agent decision queue is full, saving decision synchronously")
+        db = SessionLocal()
+        try:
+            save_agent_decision(db, decision_dict)
+        finally:
+            db.close()
+
+def flush_agent_decisions():
+    """Block until every queued agent decision has been written."""
+    if _decision_writer is not None:
+        _decisions_q.join()
+
+atexit.register(flush_agent_decisions)
@@ -1,10 +1,11 @@
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
+import httpx
 import os
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Retrieve API keys from environment
@@ -22,10 +23,22 @@ elif not groq_api_key and use_groq:
     logger.error("GROQ_API_KEY is required when USE_GROQ is enabled")
     raise ValueError("Please set the GROQ_API_KEY environment variable when using Groq")
 
+# One keep-alive pool shared by every LLM call, so concurrent agents reuse TLS
+# connections instead of handshaking per request. CrewAI drives the LLM
+# synchronously from worker threads, hence a sync client.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+llm_http_client = httpx.Client(
+    limits=httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS // 2
+    )
+)
+
 # LLM Configuration
 if use_groq and groq_api_key:
     llm = ChatGroq(
         api_key=groq_api_key,
+        http_client=llm_http_client,
         model="llama-3.3-70b-versatile",
         temperature=0.7,
     )
@@ -35,6 +48,7 @@ else:
         api_key=openrouter_api_key,
         model="openrouter/anthropic/claude-3.5-sonnet",
         base_url="https://openrouter.ai/api/v1",
+        http_client=llm_http_client,
         extra_headers={
             "HTTP-Referer": os.getenv("YOUR_SITE_URL", "http://localhost"),
             "X-Title": os.getenv("YOUR_SITE_NAME", "Dynamic Pricing Agent"),
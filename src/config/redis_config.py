@@ -0,0 +1,29 @@
+import redis
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+
+# Shared, bounded connection pools so every agent in a worker reuses the same
+# connections instead of opening its own.
+redis_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    decode_responses=True
+)
+
+# Binary-safe pool for msgpack-encoded scrape events
+redis_binary_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    decode_responses=False
+)
+
+redis_client = redis.Redis(connection_pool=redis_pool)
+redis_binary_client = redis.Redis(connection_pool=redis_binary_pool)
@@ -1,29 +1,36 @@
 import dotenv
 dotenv.load_dotenv()
 
-from pydantic import validator
-from pydantic_settings import BaseSettings
+from pydantic import Field, ValidationInfo, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache
 from typing import Optional
 import urllib.parse
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(case_sensitive=True, env_file=".env")
+
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "Postgres@"
     POSTGRES_SERVER: str = "localhost"
     POSTGRES_PORT: str = "5432"
     POSTGRES_DB: str = "dynamic-pricing-db"
-    SQLALCHEMY_DATABASE_URI: Optional[str] = None
+    # validate_default so the DSN is assembled when it isn't set explicitly
+    SQLALCHEMY_DATABASE_URI: Optional[str] = Field(default=None, validate_default=True)
 
-    @validator("SQLALCHEMY_DATABASE_URI", pre=True)
-    def assemble_db_connection(cls, v: Optional[str], values: dict[str, str]) -> str:
+    @field_validator("SQLALCHEMY_DATABASE_URI", mode="before")
+    @classmethod
+    def assemble_db_connection(cls, v: Optional[str], info: ValidationInfo) -> str:
         if isinstance(v, str) and v:
             return v
+        values = info.data
         # URL encode the password to handle special characters like '@'
         password = urllib.parse.quote_plus(values.get('POSTGRES_PASSWORD', ''))
         return f"postgresql+psycopg2://{values.get('POSTGRES_USER')}:{password}@{values.get('POSTGRES_SERVER')}:{values.get('POSTGRES_PORT')}/{values.get('POSTGRES_DB')}"
 
-    class Config:
-        case_sensitive = True
-        env_file = ".env"
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Process-wide settings; env parsing and DSN assembly run once."""
+    return Settings()
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
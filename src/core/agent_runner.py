@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Max concurrent calls per agent, sized to what each downstream (browser
+# sessions, embedding model + Pinecone, LLM provider) can absorb.
+AGENT_CONCURRENCY = {
+    "web_scraping": 4,
+    "competitor_monitoring": 8,
+    "supervisor": 4,
+}
+
+# Seconds a caller waits for an agent before giving up. Selenium scrapes
+# and full supervisor runs are slow; similarity lookups are not.
+AGENT_TIMEOUTS = {
+    "web_scraping": 120,
+    "competitor_monitoring": 30,
+    "supervisor": 300,
+}
+
+# Cap across all agents, below the sum of the per-agent limits, so a burst that
+# hits every endpoint at once can't saturate the LLM provider and worker threads
+MAX_CONCURRENT_AGENTS = int(os.getenv("MAX_CONCURRENT_AGENTS", "8"))
+
+SEMAPHORES = {name: asyncio.Semaphore(limit) for name, limit in AGENT_CONCURRENCY.items()}
+GLOBAL_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_AGENTS)
+_in_flight = {name: 0 for name in AGENT_CONCURRENCY}
+
+class AgentBusyError(asyncio.TimeoutError):
+    """No concurrency slot freed up for the agent within its timeout."""
+
+async def run_agent(name: str, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking agent call in a worker thread, bounded by the agent's semaphore
+    and the global one (always acquired in that order).
+    The agent's timeout covers waiting for both slots plus the call itself: raises
+    AgentBusyError if no slot frees up in time, asyncio.TimeoutError if the call overruns.
+    The thread cannot be cancelled, so its semaphore slot is only released when it
+    actually finishes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + AGENT_TIMEOUTS[name]
+    semaphore = SEMAPHORES[name]
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=deadline - loop.time())
+    except asyncio.TimeoutError:
+        logger.warning("[AgentRunner] No %s agent slot free within %ss", name, AGENT_TIMEOUTS[name])
+        raise AgentBusyError(name) from None
+    try:
+        await asyncio.wait_for(GLOBAL_SEMAPHORE.acquire(), timeout=max(0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        semaphore.release()
+        logger.warning("[AgentRunner] No global agent slot free within %ss for %s", AGENT_TIMEOUTS[name], name)
+        raise AgentBusyError(name) from None
+    except BaseException:
+        semaphore.release()
+        raise
+    _in_flight[name] += 1
+    started = time.perf_counter()
+
+    def _release(call):
+        _in_flight[name] -= 1
+        GLOBAL_SEMAPHORE.release()
+        semaphore.release()
+        logger.info("[AgentRunner] %s agent finished in %.2fs", name, time.perf_counter() - started)
+        # Mark the outcome as retrieved; a caller that timed out never awaits it
+        if not call.cancelled():
+            call.exception()
+
+    call = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    call.add_done_callback(_release)
+    try:
+        return await asyncio.wait_for(asyncio.shield(call), timeout=max(0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        logger.error("[AgentRunner] %s agent timed out after %ss", name, AGENT_TIMEOUTS[name])
+        raise
+
+_coalesced_futures: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+
+async def run_agent_coalesced(name: str, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Like run_agent, but concurrent calls for the same (agent, key) share one execution.
+    The check-and-set below has no await in between, so it is atomic on the event loop.
+    """
+    inflight_key = (name, key)
+    call = _coalesced_futures.get(inflight_key)
+    if call is None:
+        call = asyncio.ensure_future(run_agent(name, fn, *args))
+        _coalesced_futures[inflight_key] = call
+
+        def _forget(done):
+            _coalesced_futures.pop(inflight_key, None)
+            if not done.cancelled():
+                done.exception()
+
+        call.add_done_callback(_forget)
+    else:
+        logger.info("[AgentRunner] Joining in-flight %s call for %s", name, key)
+    # Shielded so one caller disconnecting doesn't cancel the shared call for the others
+    return await asyncio.shield(call)
+
+def agent_concurrency_usage() -> Dict[str, Dict[str, int]]:
+    """Current in-flight calls per agent and in total, for the health endpoint."""
+    usage = {
+        name: {"in_flight": _in_flight[name], "limit": limit}
+        for name, limit in AGENT_CONCURRENCY.items()
+    }
+    usage["total"] = {"in_flight": sum(_in_flight.values()), "limit": MAX_CONCURRENT_AGENTS}
+    return usage
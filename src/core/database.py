@@ -1,24 +1,67 @@
+from contextlib import ExitStack
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
-from config.database import SessionLocal, engine, Base
+from config.database import SessionLocal, engine, async_engine, DB_POOL_SIZE
+from models.base import Base
 # Ensure all models are imported so their tables are created
 from models import products, competitor_prices, agent_decisions
+import random
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+_db_initialized = False
+
+# Arbitrary application-wide key for the schema-setup advisory lock
+SCHEMA_LOCK_KEY = 720431
+
 def init_db(max_retries: int = 5, delay: int = 2):
+    global _db_initialized
+    if _db_initialized:
+        logger.info("Database already initialized, skipping")
+        return
     retry_count = 0
     while retry_count < max_retries:
         try:
             logger.info(f"Attempting to connect to database (attempt {retry_count + 1})")
-            Base.metadata.create_all(bind=engine)
+            # Uvicorn workers all run startup at once; the advisory lock makes them
+            # take turns so only the first issues DDL and the rest find the tables
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+                Base.metadata.create_all(bind=conn)
             logger.info("Database tables created successfully")
+            _db_initialized = True
             return
         except SQLAlchemyError as e:
             retry_count += 1
-            logger.error(f"Database connection failed (attempt {retry_count}): {str(e)}")
+            logger.error("Database connection failed (attempt %s): %s", retry_count, e)
             if retry_count == max_retries:
                 logger.error("Max retries reached. Could not connect to database.")
                 raise
-            time.sleep(delay)
\ No newline at end of file
+            # Exponential backoff with jitter so a restarting fleet doesn't reconnect in lockstep
+            time.sleep(min(30, delay * 2 ** (retry_count - 1)) + random.uniform(0, 1))
+
+def warm_connection_pool(connections: int = 5):
+    """Open `connections` pooled connections at once so the first requests don't pay for connect/auth"""
+    # Holding more than the pool keeps would block on overflow slots and discard them after
+    connections = min(connections, DB_POOL_SIZE)
+    with ExitStack() as stack:
+        for _ in range(connections):
+            conn = stack.enter_context(engine.connect())
+            conn.execute(text("SELECT 1"))
+    logger.info(f"Warmed {connections} sync database connections")
+
+async def warm_async_connection_pool(connections: int = 5):
+    """Async counterpart of warm_connection_pool for the request-path engine"""
+    connections = min(connections, DB_POOL_SIZE)
+    conns = []
+    try:
+        for _ in range(connections):
+            conn = await async_engine.connect()
+            conns.append(conn)
+            await conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            await conn.close()
+    logger.info(f"Warmed {connections} async database connections")
@@ -0,0 +1,31 @@
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def start_queue_logging() -> None:
+    """
+    Route all log records through a queue so request handlers never block on stream I/O.
+    The root logger's existing handlers (set up by basicConfig) move to a background
+    QueueListener thread; the root logger itself only enqueues records.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    handlers = root.handlers[:] or [logging.StreamHandler()]
+    log_queue = queue.SimpleQueue()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_queue_logging() -> None:
+    """Flush queued records and restore the original handlers on the root logger."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().handlers = list(_listener.handlers)
+    _listener = None
@@ -0,0 +1,71 @@
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
+import redis
+
+from config.redis_config import redis_binary_client
+
+logger = logging.getLogger(__name__)
+
+PRICING_HISTORY_TTL_SECONDS = 60
+SIMILAR_PRODUCTS_TTL_SECONDS = 300
+
+# Per-process hit/miss counts, reported by the health endpoint. Lookups run in
+# to_thread workers, so increments take the lock
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+def pricing_history_cache_key(product_id: str) -> str:
+    # One hash per product (field = days) so a new scrape can drop every window with one DEL
+    return f"resp:pricing_history:{product_id}"
+
+def similar_products_cache_key(product_name: str, category: str, limit: int) -> str:
+    return f"resp:similar:{category}:{product_name}:{limit}"
+
+def get_cached_response(key: str, field: Optional[str] = None) -> Optional[bytes]:
+    """Return the cached JSON body for a key (or hash field), or None on miss/Redis error."""
+    try:
+        if field is None:
+            cached = redis_binary_client.get(key)
+        else:
+            cached = redis_binary_client.hget(key, field)
+    except redis.RedisError as e:
+        logger.warning("[ResponseCache] Read failed for %s: %s", key, e)
+        cached = None
+    with _stats_lock:
+        _stats["hits" if cached is not None else "misses"] += 1
+    return cached
+
+def cache_response(key: str, payload: Any, ttl: int, field: Optional[str] = None) -> bytes:
+    """Serialize a response payload, store it with a TTL and return the encoded body."""
+    body = orjson.dumps(payload, default=str)
+    try:
+        if field is None:
+            redis_binary_client.setex(key, ttl, body)
+        else:
+            pipe = redis_binary_client.pipeline(transaction=False)
+            pipe.hset(key, field, body)
+            pipe.expire(key, ttl)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("[ResponseCache] Write failed for %s: %s", key, e)
+    return body
+
+def invalidate_pricing_history(product_ids) -> None:
+    """Drop cached pricing history for products whose competitor prices changed."""
+    keys = [pricing_history_cache_key(product_id) for product_id in set(product_ids)]
+    if not keys:
+        return
+    try:
+        redis_binary_client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning("[ResponseCache] Invalidation failed for %s: %s", keys, e)
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counts and hit ratio since this worker started."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    return {**stats, "hit_ratio": round(stats["hits"] / lookups, 3) if lookups else None}
@@ -1,15 +1,47 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-from core.database import init_db
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Callable, Hashable, Optional, Type, TypeVar
+from datetime import datetime
+from decimal import Decimal
+from core.database import init_db, warm_connection_pool, warm_async_connection_pool
+from config.database import WEB_CONCURRENCY, async_engine, get_async_db, get_async_read_db, flush_agent_decisions, save_products_async, get_existing_product_ids_async, list_products_async
+from config.redis_config import redis_client
+from config.llm_config import llm_http_client
+import asyncio
 import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import anyio.to_thread
 import os
+from contextlib import asynccontextmanager
 
-from agents import run_web_scraping_agent, run_competitor_monitoring_agent, run_supervisor_agent
+from core.agent_runner import AgentBusyError, run_agent, run_agent_coalesced, agent_concurrency_usage
+from core.logging_config import start_queue_logging, stop_queue_logging
+from core.response_cache import (
+    PRICING_HISTORY_TTL_SECONDS,
+    SIMILAR_PRODUCTS_TTL_SECONDS,
+    cache_response,
+    cache_stats,
+    get_cached_response,
+    pricing_history_cache_key,
+    similar_products_cache_key,
+)
+from agents import run_web_scraping_agent, run_competitor_monitoring_agent, run_supervisor_agent, supervisor_agent, competitor_monitoring_agent
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Dynamic Pricing Agentic System", version="1.0.0")
+MAX_BATCH_SIZE = 100
+MAX_PRODUCT_BULK_SIZE = 5000
+MAX_PRODUCT_PAGE_SIZE = 1000
+# Each best-price lookup drives its own browser sessions, so keep the fan-out small
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
 
 # Pydantic models for API requests
 class WebScrapingRequest(BaseModel):
@@ -21,16 +53,91 @@ class CompetitorMonitoringRequest(BaseModel):
     product_data: Optional[Dict[str, Any]] = None
 
 class SupervisorRequest(BaseModel):
-    products: List[Dict[str, Any]]
+    # Either a single product_name (best competitor price) or products (full pricing cycle)
+    product_name: Optional[str] = None
+    products: Optional[List[Dict[str, Any]]] = None
+
+    @model_validator(mode="after")
+    def check_one_input(self):
+        if (self.product_name is None) == (self.products is None):
+            raise ValueError("Provide exactly one of product_name or products")
+        return self
+
+class ProductCreateRequest(BaseModel):
+    id: str = Field(..., max_length=20)
+    name: str = Field(..., max_length=200)
+    category: Optional[str] = Field(None, max_length=100)
+    # Bounds mirror the Numeric(precision, scale) columns so overflow is a 422, not a DB error
+    base_price: Decimal = Field(..., ge=0, max_digits=10, decimal_places=2)
+    current_price: Decimal = Field(..., ge=0, max_digits=10, decimal_places=2)
+    cost_price: Optional[Decimal] = Field(None, ge=0, max_digits=10, decimal_places=2)
+    stock_level: int = Field(0, ge=0)
+    demand_score: Optional[Decimal] = Field(None, ge=0, max_digits=3, decimal_places=2)
+
+class ProductBulkCreateRequest(BaseModel):
+    products: List[ProductCreateRequest] = Field(..., min_length=1, max_length=MAX_PRODUCT_BULK_SIZE)
+
+    @model_validator(mode="after")
+    def check_unique_ids(self):
+        counts = Counter(product.id for product in self.products)
+        duplicates = sorted(product_id for product_id, count in counts.items() if count > 1)
+        if duplicates:
+            raise ValueError(f"Duplicate product ids in request: {duplicates}")
+        return self
 
-@app.on_event("startup")
-async def startup_event():
+class SupervisorBatchRequest(BaseModel):
+    product_names: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+def json_body_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """OpenAPI request body for routes that parse the raw body themselves"""
+    return {
+        "requestBody": {
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+            "required": True
+        }
+    }
+
+async def parse_json_body(http_request: Request, model: Type[ModelT]) -> ModelT:
+    """Validate the raw body with pydantic's JSON parser, skipping the intermediate dict"""
     try:
-        init_db()
+        return model.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_queue_logging()
+    try:
+        # Sync offload goes through anyio's limiter (FastAPI) and the loop's default
+        # executor (asyncio.to_thread); size both so agent calls don't queue behind 40 tokens
+        thread_tokens = int(os.getenv("ANYIO_THREAD_TOKENS", "200"))
+        anyio.to_thread.current_default_thread_limiter().total_tokens = thread_tokens
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=thread_tokens))
+        # Replicas set DB_INIT=0 so only one instance runs schema setup
+        if os.getenv('DB_INIT', '1') == '1':
+            await asyncio.to_thread(init_db)
+        # Hand the first requests already-authenticated connections
+        warm_connections = int(os.getenv("DB_POOL_WARM_CONNECTIONS", "5"))
+        await asyncio.to_thread(warm_connection_pool, warm_connections)
+        await warm_async_connection_pool(warm_connections)
+        await asyncio.to_thread(redis_client.ping)
+        # Agent singletons are built once at import; handlers reach them through app.state
+        app.state.supervisor = supervisor_agent
+        app.state.competitor = competitor_monitoring_agent
         logger.info("Dynamic Pricing Agentic System started successfully")
     except Exception as e:
-        logger.error(f"Application startup failed: {str(e)}")
+        logger.error("Application startup failed: %s", e)
         raise
+    yield
+    await asyncio.to_thread(flush_agent_decisions)
+    await async_engine.dispose()
+    llm_http_client.close()
+    logger.info("Dynamic Pricing Agentic System shut down")
+    stop_queue_logging()
+
+app = FastAPI(title="Dynamic Pricing Agentic System", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 @app.get("/")
 async def root():
@@ -40,110 +147,262 @@ async def root():
         "agents": ["web_scraping", "competitor_monitoring", "supervisor"]
     }
 
+# Service configuration is fixed for the life of the process
+HEALTH_SERVICES = {
+    "database": "connected",
+    "redis": "connected" if os.getenv('REDIS_HOST') else "not_configured",
+    "pinecone": "connected" if os.getenv('PINECONE_API_KEY') else "not_configured"
+}
+
+async def _check_dependencies() -> Dict[str, str]:
+    """Ping the database and Redis for readiness probes"""
+    services = dict(HEALTH_SERVICES)
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.error("[API] Database health check failed: %s", e)
+        services["database"] = "unavailable"
+    try:
+        await asyncio.to_thread(redis_client.ping)
+        services["redis"] = "connected"
+    except Exception as e:
+        logger.error("[API] Redis health check failed: %s", e)
+        services["redis"] = "unavailable"
+    return services
+
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
+async def health_check(deep: bool = False):
+    """Health check endpoint; deep=true also pings the database and Redis"""
+    services = await _check_dependencies() if deep else HEALTH_SERVICES
     return {
-        "status": "healthy",
-        "timestamp": "2024-01-01T00:00:00Z",
-        "services": {
-            "database": "connected",
-            "redis": "connected" if os.getenv('REDIS_HOST') else "not_configured",
-            "pinecone": "connected" if os.getenv('PINECONE_API_KEY') else "not_configured"
-        }
+        "status": "healthy" if "unavailable" not in services.values() else "degraded",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "services": services,
+        "agent_concurrency": agent_concurrency_usage(),
+        "response_cache": cache_stats()
     }
 
-@app.post("/agents/web-scraping")
-async def run_web_scraping(request: WebScrapingRequest):
-    logger.warning("[API] Direct web scraping agent call detected. For full agentic workflow, use /agents/supervisor.")
-    logger.info(f"[API] /agents/web-scraping called with: {request}")
-    try:
-        result = run_web_scraping_agent({
-            "domain": request.domain,
-            "category": request.category,
-            "product_name": request.product_name
-        })
-        logger.info(f"[API] Web scraping agent result: {result}")
-        if result["status"] == "success":
-            return {
-                "status": "success",
-                "message": "Web scraping completed successfully (note: for full agentic workflow, use /agents/supervisor)",
-                "data": result["data"]
-            }
-        else:
+def make_agent_endpoint(name: str, fn: Callable[[Any], Dict[str, Any]], request_model: Type[BaseModel],
+                        build_input: Callable[[Any], Any], label: str, success_message: str,
+                        direct_call: bool = False, coalesce_key: Optional[Callable[[Any], Optional[Hashable]]] = None):
+    """Build a POST handler that runs an agent through run_agent and maps its result to a response"""
+    async def endpoint(http_request: Request):
+        request = await parse_json_body(http_request, request_model)
+        if direct_call:
+            logger.warning("[API] Direct %s agent call detected. For full agentic workflow, use /agents/supervisor.", label.lower())
+        logger.debug("[API] %s request: %s", label, request)
+        key = coalesce_key(request) if coalesce_key else None
+        try:
+            if key is not None:
+                result = await run_agent_coalesced(name, key, fn, build_input(request))
+            else:
+                result = await run_agent(name, fn, build_input(request))
+        except AgentBusyError:
+            raise HTTPException(status_code=503, detail=f"{label} is at capacity, retry later")
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"{label} timed out")
+        except Exception as e:
+            logger.error("[API] Error in %s: %s", label.lower(), e)
+            raise HTTPException(status_code=500, detail=f"{label} failed: {str(e)}")
+        logger.info("[API] %s finished with status=%s", label, result["status"])
+        logger.debug("[API] %s result: %s", label, result)
+        if result["status"] != "success":
             raise HTTPException(status_code=400, detail=result["message"])
-    except Exception as e:
-        logger.error(f"[API] Error in web scraping agent: {e}")
-        raise HTTPException(status_code=500, detail=f"Web scraping failed: {str(e)}")
+        return {
+            "status": "success",
+            "message": success_message,
+            "data": result.get("data")
+        }
+    endpoint.__name__ = f"run_{name}"
+    return endpoint
 
-@app.post("/agents/competitor-monitoring")
-async def run_competitor_monitoring(request: CompetitorMonitoringRequest):
-    logger.warning("[API] Direct competitor monitoring agent call detected. For full agentic workflow, use /agents/supervisor.")
-    logger.info(f"[API] /agents/competitor-monitoring called with: {request}")
-    try:
-        result = run_competitor_monitoring_agent(request.product_data)
-        logger.info(f"[API] Competitor monitoring agent result: {result}")
+AGENT_ENDPOINTS = [
+    dict(
+        path="/agents/web-scraping",
+        name="web_scraping",
+        fn=run_web_scraping_agent,
+        request_model=WebScrapingRequest,
+        build_input=lambda request: request.model_dump(),
+        label="Web scraping",
+        success_message="Web scraping completed successfully (note: for full agentic workflow, use /agents/supervisor)",
+        direct_call=True,
+        coalesce_key=lambda request: (request.domain.lower(), request.category, request.product_name)
+    ),
+    dict(
+        path="/agents/competitor-monitoring",
+        name="competitor_monitoring",
+        fn=run_competitor_monitoring_agent,
+        request_model=CompetitorMonitoringRequest,
+        build_input=lambda request: request.product_data,
+        label="Competitor monitoring",
+        success_message="Competitor monitoring completed successfully (note: for full agentic workflow, use /agents/supervisor)",
+        direct_call=True
+    ),
+    dict(
+        path="/agents/supervisor",
+        name="supervisor",
+        fn=run_supervisor_agent,
+        request_model=SupervisorRequest,
+        build_input=lambda request: request.model_dump(exclude_none=True),
+        label="Supervisor agent",
+        success_message="Supervisor agent completed successfully",
+        coalesce_key=lambda request: request.product_name
+    ),
+]
+
+for spec in AGENT_ENDPOINTS:
+    spec = dict(spec)
+    path = spec.pop("path")
+    app.add_api_route(
+        path,
+        make_agent_endpoint(**spec),
+        methods=["POST"],
+        openapi_extra=json_body_schema(spec["request_model"])
+    )
+
+@app.post("/agents/supervisor/batch", openapi_extra=json_body_schema(SupervisorBatchRequest))
+async def run_supervisor_batch(http_request: Request):
+    """Find the best competitor price for many products in one request"""
+    request = await parse_json_body(http_request, SupervisorBatchRequest)
+    logger.info("[API] /agents/supervisor/batch called with %d products", len(request.product_names))
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def analyze_one(product_name: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await run_agent_coalesced("supervisor", product_name, run_supervisor_agent, {"product_name": product_name})
+            except AgentBusyError:
+                return {"product_name": product_name, "status": "error", "error": "busy"}
+            except asyncio.TimeoutError:
+                return {"product_name": product_name, "status": "error", "error": "timeout", "timeout": True}
+            except Exception as e:
+                logger.error("[API] Error in supervisor batch for %s: %s", product_name, e)
+                return {"product_name": product_name, "status": "error", "error": str(e)}
         if result["status"] == "success":
-            return {
-                "status": "success",
-                "message": "Competitor monitoring completed successfully (note: for full agentic workflow, use /agents/supervisor)",
-                "data": result.get("data")
-            }
-        else:
-            raise HTTPException(status_code=400, detail=result["message"])
-    except Exception as e:
-        logger.error(f"[API] Error in competitor monitoring agent: {e}")
-        raise HTTPException(status_code=500, detail=f"Competitor monitoring failed: {str(e)}")
+            return {"product_name": product_name, "status": "success", "data": result["data"]}
+        return {"product_name": product_name, "status": "error", "error": result["message"]}
+
+    # Repeated names would queue behind the semaphore and miss the in-flight
+    # call they could have joined, so look each name up once
+    unique_names = list(dict.fromkeys(request.product_names))
+    unique_results = await asyncio.gather(*(analyze_one(name) for name in unique_names))
+    by_name = dict(zip(unique_names, unique_results))
+    return {
+        "status": "success",
+        "message": "Supervisor batch completed",
+        "results": [by_name[name] for name in request.product_names]
+    }
 
-@app.post("/agents/supervisor")
-async def run_supervisor(request: SupervisorRequest):
-    logger.info(f"[API] /agents/supervisor called with: {request}")
+@app.post("/products/bulk", status_code=201, openapi_extra=json_body_schema(ProductBulkCreateRequest))
+async def add_products_bulk(http_request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Create many products with a single multi-row INSERT"""
+    request = await parse_json_body(http_request, ProductBulkCreateRequest)
+    logger.info("[API] /products/bulk called with %d products", len(request.products))
+    last_updated = datetime.now()
+    products = [{**product.model_dump(), "last_updated": last_updated} for product in request.products]
     try:
-        result = run_supervisor_agent({"products": request.products})
-        logger.info(f"[API] Supervisor agent result: {result}")
-        if result["status"] == "success":
-            return {
-                "status": "success",
-                "message": "Supervisor agent completed successfully",
-                "data": result["data"]
-            }
-        else:
-            raise HTTPException(status_code=400, detail=result["message"])
+        existing = await get_existing_product_ids_async(db, [product["id"] for product in products])
+        if not existing:
+            await save_products_async(db, products)
+    except IntegrityError as e:
+        # Lost a race with a concurrent insert; the driver message stays in the log
+        logger.warning("[API] Conflict creating products: %s", e.orig)
+        raise HTTPException(status_code=409, detail="One or more products already exist")
     except Exception as e:
-        logger.error(f"[API] Error in supervisor agent: {e}")
-        raise HTTPException(status_code=500, detail=f"Supervisor agent failed: {str(e)}")
+        logger.error("[API] Error creating products: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to create products: {str(e)}")
+    if existing:
+        raise HTTPException(status_code=409, detail=f"Products already exist: {sorted(existing)}")
+    return {
+        "status": "success",
+        "message": f"Created {len(products)} products",
+        "product_ids": [product["id"] for product in products]
+    }
+
+def _optional_float(value: Optional[Decimal]) -> Optional[float]:
+    return float(value) if value is not None else None
+
+@app.get("/products")
+async def list_products(after_id: Optional[str] = None, limit: int = Query(200, ge=1, le=MAX_PRODUCT_PAGE_SIZE),
+                        db: AsyncSession = Depends(get_async_read_db)):
+    """List products one keyset page at a time; pass the X-Next-Cursor header back as after_id"""
+    rows = await list_products_async(db, after_id, limit)
+    products = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "category": row.category,
+            "base_price": _optional_float(row.base_price),
+            "current_price": _optional_float(row.current_price),
+            "cost_price": _optional_float(row.cost_price),
+            "stock_level": row.stock_level,
+            "demand_score": _optional_float(row.demand_score),
+            "last_updated": row.last_updated
+        }
+        for row in rows
+    ]
+    # A short page means the catalog is exhausted
+    headers = {"X-Next-Cursor": rows[-1].id} if len(rows) == limit else {}
+    return ORJSONResponse(products, headers=headers)
 
 @app.get("/agents/supervisor/history/{product_id}")
-async def get_pricing_history(product_id: str, days: int = 30):
+async def get_pricing_history(request: Request, product_id: str, days: int = 30, db: AsyncSession = Depends(get_async_read_db)):
     """Get pricing history for a specific product"""
+    cache_key = pricing_history_cache_key(product_id)
+    cached = await asyncio.to_thread(get_cached_response, cache_key, str(days))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
     try:
-        from agents.supervisor_agent import supervisor_agent
-        history = supervisor_agent.get_pricing_history(product_id, days)
-        return {
+        history = await request.app.state.supervisor.get_pricing_history_async(db, product_id, days)
+        response = {
             "status": "success",
             "product_id": product_id,
             "history": history
         }
+        # Reuse the bytes written to the cache instead of encoding the payload twice
+        body = await asyncio.to_thread(cache_response, cache_key, response, PRICING_HISTORY_TTL_SECONDS, str(days))
+        return Response(content=body, media_type="application/json")
     except Exception as e:
-        logger.error(f"Error retrieving pricing history: {e}")
+        logger.error("Error retrieving pricing history: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve pricing history: {str(e)}")
 
 @app.get("/agents/competitor-monitoring/similar/{product_name}")
-async def get_similar_products(product_name: str, category: str, limit: int = 5):
+async def get_similar_products(request: Request, product_name: str, category: str, limit: int = 5):
     """Get similar products using vector similarity search"""
+    cache_key = similar_products_cache_key(product_name, category, limit)
+    cached = await asyncio.to_thread(get_cached_response, cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
     try:
-        from agents.competitor_monitoring_agent import competitor_monitoring_agent
-        similar_products = competitor_monitoring_agent.get_similar_products(product_name, category, limit)
-        return {
+        similar_products = await run_agent_coalesced(
+            "competitor_monitoring", cache_key, request.app.state.competitor.find_similar_products, product_name, category, limit
+        )
+        response = {
             "status": "success",
             "product_name": product_name,
             "category": category,
             "similar_products": similar_products
         }
+        # Reuse the bytes written to the cache instead of encoding the payload twice
+        body = await asyncio.to_thread(cache_response, cache_key, response, SIMILAR_PRODUCTS_TTL_SECONDS)
+        return Response(content=body, media_type="application/json")
+    except AgentBusyError:
+        raise HTTPException(status_code=503, detail="Similar product search is at capacity, retry later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Similar product search timed out")
     except Exception as e:
-        logger.error(f"Error finding similar products: {e}")
+        logger.error("Error finding similar products: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to find similar products: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvicorn[standard] brings uvloop + httptools, which loop/http="auto" pick up.
+    # Each worker has its own semaphores and in-flight map; shared caches live in Redis.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=WEB_CONCURRENCY,
+        log_level=os.getenv("LOG_LEVEL", "INFO").lower()
+    )
\ No newline at end of file
@@ -1,8 +1,14 @@
-from sqlalchemy import Column,Integer,Numeric, ForeignKey, String, DateTime
+from sqlalchemy import Column,Integer,Numeric, ForeignKey, String, DateTime, Index
 from models.base import BaseModel
 
 class CompetitorPrice(BaseModel):
     __tablename__ = "competitor_prices"
+    __table_args__ = (
+        # History reads and the feature average filter by product and a scraped_at window
+        Index("ix_competitor_prices_product_scraped", "product_id", "scraped_at"),
+        # Append-only, time-ordered rows: a BRIN index covers wide date ranges cheaply
+        Index("ix_competitor_prices_scraped_brin", "scraped_at", postgresql_using="brin"),
+    )
 
     product_id = Column(String(50), index=True)
     product_name = Column(String(255))
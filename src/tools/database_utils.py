@@ -1,16 +1,17 @@
-from config.database import get_db
+from config.database import engine
+from models.base import Base
 from core.database import init_db
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 def check_db_connection():
     try:
-        db = next(get_db())
-        db.execute("SELECT 1")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         return True
     except SQLAlchemyError:
         return False
 
 def recreate_tables():
-    from ..config.database import Base, engine
     Base.metadata.drop_all(bind=engine)
-    init_db()
\ No newline at end of file
+    init_db()
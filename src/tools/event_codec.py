@@ -0,0 +1,45 @@
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Union
+
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+# Leading byte identifying the wire format of a scrape event. Bump it when the
+# payload layout changes so consumers can keep decoding older entries.
+# v1 carried `scraped_at` as epoch seconds; v2 carries epoch microseconds.
+WIRE_FORMAT_VERSION = b'\x02'
+_EPOCH_SECONDS_FORMAT = b'\x01'
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def to_epoch_micros(value: datetime) -> int:
+    """Convert a naive UTC (or tz-aware) datetime to integer epoch microseconds, losslessly."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+def pack_scrape_event(event: Dict[str, Any]) -> bytes:
+    """Encode a scrape event as a version-prefixed msgpack payload."""
+    return WIRE_FORMAT_VERSION + msgpack.packb(event, default=str)
+
+def unpack_scrape_event(data: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    Decode a scrape event published on Redis.
+    Falls back to JSON for payloads written before the msgpack migration.
+    An epoch `scraped_at` is turned back into a naive UTC datetime, exactly
+    matching the value the scraper stored.
+    """
+    version = data[:1] if isinstance(data, bytes) else None
+    if version in (WIRE_FORMAT_VERSION, _EPOCH_SECONDS_FORMAT):
+        event = msgpack.unpackb(data[1:], raw=False)
+    else:
+        logger.debug("[EventCodec] Decoding legacy JSON scrape event")
+        event = json.loads(data)
+    scraped_at = event.get('scraped_at')
+    if isinstance(scraped_at, int) and version == WIRE_FORMAT_VERSION:
+        event['scraped_at'] = (_EPOCH + timedelta(microseconds=scraped_at)).replace(tzinfo=None)
+    elif isinstance(scraped_at, (int, float)):
+        event['scraped_at'] = datetime.fromtimestamp(scraped_at, tz=timezone.utc).replace(tzinfo=None)
+    return event
@@ -3,8 +3,10 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 import requests
 from bs4 import BeautifulSoup
-from config.database import get_db, save_competitor_prices
+from config.database import SessionLocal, save_competitor_prices
+from core.response_cache import invalidate_pricing_history
 import logging
+import os
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -15,9 +17,15 @@ from selenium.webdriver.support import expected_conditions as EC
 import hashlib
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
+def store_competitor_prices(products):
+    """Save scraped prices and drop the cached pricing history of the affected products"""
+    with SessionLocal() as db:
+        save_competitor_prices(db, products)
+    invalidate_pricing_history(product["product_id"] for product in products)
+
 # ✅ Input schema
 class ScrapeProductInput(BaseModel):
     url: str = Field(..., description="The product listing page URL to scrape")
@@ -230,7 +238,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                 search_box.submit()
                 time.sleep(2)
             except Exception as e:
-                logger.error(f"Error entering category in Flipkart search bar: {e}")
+                logger.error("Error entering category in Flipkart search bar: %s", e)
                 driver.save_screenshot('flipkart_searchbar_error.png')
             # Step 3: Enter product name in the search bar and submit
             try:
@@ -244,7 +252,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                 search_box.submit()
                 time.sleep(2)
             except Exception as e:
-                logger.error(f"Error entering product name in Flipkart search bar: {e}")
+                logger.error("Error entering product name in Flipkart search bar: %s", e)
                 driver.save_screenshot('flipkart_searchbar_error.png')
             # Step 4: Scrape the resulting product listing page (Amazon-style)
             try:
@@ -261,6 +269,20 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                         product_cards = cards
                         break
                 logger.info(f"Found {len(product_cards)} Flipkart product cards on listing page.")
+                # Breadcrumbs belong to the page, not to a card, and every card on the page
+                # shares one scrape time: look both up once instead of per card
+                page_category = None
+                try:
+                    # Flipkart: Breadcrumbs are often in '._2whKao' or '._1MR4o5' classes
+                    breadcrumb_selectors = ['._2whKao', '._1MR4o5', 'nav.breadcrumbs', '.breadcrumb']
+                    for sel in breadcrumb_selectors:
+                        elems = driver.find_elements(By.CSS_SELECTOR, sel)
+                        if elems:
+                            page_category = ' > '.join([e.text for e in elems if e.text])
+                            break
+                except Exception:
+                    page_category = None
+                scraped_at = datetime.utcnow()
                 scraped_names = []
                 products = []
                 for card in product_cards:
@@ -315,23 +337,12 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                         if detail_price is None:
                             try:
                                 card_html = card.get_attribute('outerHTML')
-                                logger.error(f"[Flipkart Scraper] Could not find price for card. HTML: {card_html}")
+                                logger.error("[Flipkart Scraper] Could not find price for card. HTML: %s", card_html)
                                 with open('flipkart_price_debug.html', 'a', encoding='utf-8') as f:
                                     f.write(card_html + '\n\n')
                             except Exception as e:
-                                logger.error(f"[Flipkart Scraper] Error logging card HTML: {e}")
-                        # Try to extract category from breadcrumbs or page metadata
-                        category_value = None
-                        try:
-                            # Flipkart: Breadcrumbs are often in '._2whKao' or '._1MR4o5' classes
-                            breadcrumb_selectors = ['._2whKao', '._1MR4o5', 'nav.breadcrumbs', '.breadcrumb']
-                            for sel in breadcrumb_selectors:
-                                elems = driver.find_elements(By.CSS_SELECTOR, sel)
-                                if elems:
-                                    category_value = ' > '.join([e.text for e in elems if e.text])
-                                    break
-                        except Exception:
-                            category_value = None
+                                logger.error("[Flipkart Scraper] Error logging card HTML: %s", e)
+                        category_value = page_category
                         if not category_value or category_value == "Unknown":
                             category_value = infer_category_from_name(name)
                         scraped_names.append(name)
@@ -343,7 +354,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                                 "competitor_name": competitor,
                                 "competitor_price": detail_price,
                                 "product_url": product_url,
-                                "scraped_at": datetime.utcnow()
+                                "scraped_at": scraped_at
                             }
                             products.append(product)
                     except Exception as e:
@@ -363,11 +374,10 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                     products = []
                 # Store found products in the database
                 if products:
-                    with next(get_db()) as db:
-                        save_competitor_prices(db, products)
+                    store_competitor_prices(products)
                 return products[:1] if products else []
             except Exception as e:
-                logger.error(f"Error scraping Flipkart product listing: {e}")
+                logger.error("Error scraping Flipkart product listing: %s", e)
                 with open('flipkart_scrape_exception_debug.html', 'w', encoding='utf-8') as f:
                     f.write(driver.page_source)
                 return []
@@ -383,7 +393,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                 search_box.submit()
                 time.sleep(2)
             except Exception as e:
-                logger.error(f"Error entering category in Amazon search bar: {e}")
+                logger.error("Error entering category in Amazon search bar: %s", e)
             # Step 3: Enter product name in the search bar and submit
             try:
                 search_box = driver.find_element(By.ID, 'twotabsearchtextbox')
@@ -392,10 +402,11 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                 search_box.submit()
                 time.sleep(2)
             except Exception as e:
-                logger.error(f"Error entering product name in Amazon search bar: {e}")
+                logger.error("Error entering product name in Amazon search bar: %s", e)
             # Step 4: Scrape the resulting product listing page
             product_cards = driver.find_elements(By.CSS_SELECTOR, '.s-result-item[data-asin]')
             logger.info(f"Found {len(product_cards)} Amazon product cards after two-step search.")
+            scraped_at = datetime.utcnow()
             scraped_names = []
             products = []
             for card in product_cards:
@@ -433,7 +444,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                         "category": category_value,
                         "competitor_name": competitor,
                         "competitor_price": price,
-                        "scraped_at": datetime.utcnow()
+                        "scraped_at": scraped_at
                     }
                     products.append(product)
                 except Exception as e:
@@ -453,8 +464,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
                 products = []
             # Store found products in the database
             if products:
-                with next(get_db()) as db:
-                    save_competitor_prices(db, products)
+                store_competitor_prices(products)
             return products[:1] if products else []
         else:
             with open('unknown_platform_debug.html', 'w', encoding='utf-8') as f:
@@ -462,7 +472,7 @@ def scrape_products_core(url: str, competitor: str, category: str, product_name:
             logger.error("Unknown platform. Saved page source to unknown_platform_debug.html.")
             return []
     except Exception as e:
-        logger.error(f"Error scraping {url} with Selenium: {e}")
+        logger.error("Error scraping %s with Selenium: %s", url, e)
         return []
     finally:
         driver.quit()
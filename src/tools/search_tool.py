@@ -4,16 +4,18 @@ from bs4 import BeautifulSoup
 from config.database import get_db, CompetitorPrice
 from models.products import Product
 import logging
+import os
 import re
 from datetime import datetime
 import time
 import json
 from typing import Union
 import hashlib
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, quote_plus
+from functools import lru_cache
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 def generate_product_id_from_url(url: str) -> str:
@@ -31,6 +33,20 @@ def is_valid_amazon_url(url):
     # Accept only main www.amazon.com product or search/category URLs
     return bool(re.match(r"^https://www\.amazon\.com/(s|dp/)", url))
 
+@lru_cache(maxsize=2048)
+def search_product_listing_page_core(domain: str, query: str) -> tuple[str, ...]:
+    """Builds the listing page URL(s) for a query. Cached since the mapping is deterministic."""
+    if domain in ["flipkart", "flipkart.com"]:
+        url = f"https://www.flipkart.com/search?q={quote_plus(query)}"
+        logger.info(f"Constructed Flipkart search URL: {url}")
+        return (url,)
+    elif domain in ["amazon", "amazon.com", "amazon.in"]:
+        url = f"https://www.amazon.in/s?k={quote_plus(query)}"
+        logger.info(f"Constructed Amazon search URL: {url}")
+        return (url,)
+    logger.error("Unsupported domain: %s", domain)
+    return ()
+
 @tool("search_product_listing_page")
 def search_product_listing_page(input: Union[dict, str]) -> list[dict]:
     """
@@ -59,14 +75,4 @@ def search_product_listing_page(input: Union[dict, str]) -> list[dict]:
     if not query:
         logger.error("No product_name or category provided to search tool.")
         return []
-    from urllib.parse import quote_plus
-    if domain in ["flipkart", "flipkart.com"]:
-        url = f"https://www.flipkart.com/search?q={quote_plus(query)}"
-        logger.info(f"Constructed Flipkart search URL: {url}")
-        return [url]
-    elif domain in ["amazon", "amazon.com", "amazon.in"]:
-        url = f"https://www.amazon.in/s?k={quote_plus(query)}"
-        logger.info(f"Constructed Amazon search URL: {url}")
-        return [url]
-    logger.error(f"Unsupported domain: {domain}")
-    return []
+    return list(search_product_listing_page_core(domain, query))